@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+
+# =============================================================================
+# Name:     Variant summary
+# Author:   Celina Geiss <celina.geiss@dkfz-heidelberg.de>
+# Version:  1.0
+# =============================================================================
+
+import argparse
+import glob
+import hashlib
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+
+# Parser
+
+parser = argparse.ArgumentParser(description = 'This program creates a summary table of the called variants (SNVs, indels, structural variants), the tumor cell content and the copy number ratios for the different WGS coverages and the WES data of each patient. The table is written in long format as Parquet or CSV file (chosen by the file extension). If the output file already exists, only patients whose result files changed are read again. Execute with Python 3 and install the module "pandas" (and "pyarrow" for Parquet) if necessary.')
+
+parser.add_argument('OUTPUT_FILE', help = 'Output file path (.parquet or .csv)')
+parser.add_argument('PIDS', nargs = '+', help = 'Short patient IDs (without prefix)')
+
+parser.add_argument('-r', '--results-dir', default = '/icgc/dkfzlsdf/analysis/hipo/hipo_021/illumina_comparison/downsampled_files/analysis/results_per_pid', help = 'Directory with the results per PID')
+parser.add_argument('-c', '--coverages', nargs = '+', default = ['30x', '60x', '90x', 'max'], help = 'WGS coverages (default: 30x 60x 90x max)')
+parser.add_argument('--comparison', help = 'Output file path for the WES vs. WGS comparison per coverage (.parquet or .csv)')
+parser.add_argument('-f', '--force', action = 'store_true', help = 'Read all result files of the given PIDs again, even if they did not change')
+
+args = parser.parse_args()
+
+
+# Input and output
+
+results_dir = str(args.results_dir)
+output_file = str(args.OUTPUT_FILE)
+comparison_file = args.comparison
+
+pid_prefix = 'T021-'
+pids = list(dict.fromkeys(pid_prefix + pid for pid in args.PIDS))  # remove duplicates, keep order
+
+wgs_coverages = list(args.coverages)
+wes_coverage = 'exome'
+
+
+# Columns of the summary table
+
+metrics = ['tumor_cell_content', 'functional_SNVs', 'functional_indels', 'structural_variants']
+
+column_types = {
+	'PID': 'string',
+	'coverage': 'string',
+	'sequencing': 'string',
+	'tumor_cell_content': 'Float64',
+	'functional_SNVs': 'Int64',
+	'functional_indels': 'Int64',
+	'structural_variants': 'Int64',
+	'CN_ratios': 'string',
+	'source_signature': 'string',
+}
+
+
+### Define functions
+
+# Paths of all result files of one sample (PID + coverage)
+def result_files(pid, coverage):
+	sample = '-'.join([pid, coverage])
+	sample_dir = os.path.join(results_dir, sample)
+
+	files = {
+		'purity': os.path.join(sample_dir, 'mpileup', 'snvs_%s_purityEST.txt'%(sample)),
+		'snvs': os.path.join(sample_dir, 'mpileup', 'snvs_%s_somatic_functional_snvs_conf_8_to_10.vcf'%(sample)),
+		'indels': os.path.join(sample_dir, 'platypus_indel', 'indel_%s_somatic_functional_indels_conf_8_to_10.vcf'%(sample)),
+	}
+
+	if coverage == wes_coverage:
+		files['crest_deldupinv'] = os.path.join(sample_dir, 'crest', 'tumor_%s.DELDUPINV'%(sample))
+		files['crest_tx'] = os.path.join(sample_dir, 'crest', 'tumor_%s.TX'%(sample))
+	else:
+		files['svs'] = os.path.join(sample_dir, 'SOPHIA', 'svs_%s_filtered_somatic_minEventScore5.bedpe'%(sample))
+		files['aceseq'] = sorted(glob.glob(os.path.join(sample_dir, 'ACEseq', '*ALL.png')))
+
+	return files
+
+
+# Signature over path, size and modification time of all result files of one PID
+def pid_signature(pid):
+	signature = hashlib.md5()
+
+	for coverage in wgs_coverages + [wes_coverage]:
+		for name, paths in sorted(result_files(pid, coverage).items()):
+			if isinstance(paths, str):
+				paths = [paths]
+
+			for path in paths:
+				try:
+					stat = os.stat(path)
+					signature.update(('%s\t%d\t%d\n'%(path, stat.st_size, stat.st_mtime_ns)).encode('utf-8'))
+				except FileNotFoundError:
+					signature.update(('%s\tmissing\n'%(path)).encode('utf-8'))
+
+	return signature.hexdigest()
+
+
+# Number of non-header lines (optionally only lines containing a pattern)
+def count_lines(path, pattern = None):
+	if not os.path.isfile(path):
+		return pd.NA
+
+	count = 0
+	with open(path, 'r') as file_in:
+		for line in file_in:
+			if line.startswith('#'):
+				continue
+			if pattern is None or pattern in line:
+				count += 1
+
+	return count
+
+
+# Tumor cell content = first field of the 4th line from the end of the purity estimation
+def tumor_cell_content(path):
+	if not os.path.isfile(path):
+		return pd.NA
+
+	with open(path, 'r') as purity_in:
+		lines = purity_in.read().splitlines()
+
+	if len(lines) < 4:
+		print('Warning: %s has less than 4 lines, no tumor cell content'%(path), file = sys.stderr)
+		return pd.NA
+
+	fields = lines[-4].split()
+
+	try:
+		return float(fields[0])
+	except (IndexError, ValueError):
+		print('Warning: could not read tumor cell content from line "%s" in %s'%(lines[-4], path), file = sys.stderr)
+		return pd.NA
+
+
+# Copy number ratios from the ACEseq plot names (3rd field of the file name, independent of path depth)
+def cn_ratios(paths):
+	ratios = [os.path.basename(path).split('_')[2] for path in paths if len(os.path.basename(path).split('_')) > 2]
+
+	if len(ratios) == 0:
+		return pd.NA
+
+	return ','.join(ratios)
+
+
+# Read all result files of one PID into rows of the summary table
+def pid_rows(pid, signature):
+	rows = []
+
+	for coverage in wgs_coverages + [wes_coverage]:
+		files = result_files(pid, coverage)
+
+		row = {
+			'PID': pid,
+			'coverage': coverage,
+			'sequencing': 'WES' if coverage == wes_coverage else 'WGS',
+			'tumor_cell_content': tumor_cell_content(files['purity']),
+			'functional_SNVs': count_lines(files['snvs']),
+			'functional_indels': count_lines(files['indels']),
+			'source_signature': signature,
+		}
+
+		if coverage == wes_coverage:
+			deldupinv = count_lines(files['crest_deldupinv'], 'somatic')
+			tx = count_lines(files['crest_tx'], 'somatic')
+			row['structural_variants'] = pd.NA if deldupinv is pd.NA or tx is pd.NA else deldupinv + tx
+			row['CN_ratios'] = pd.NA
+		else:
+			row['structural_variants'] = count_lines(files['svs'])
+			row['CN_ratios'] = cn_ratios(files['aceseq'])
+
+		rows.append(row)
+
+	return rows
+
+
+# Bring table in defined column order and types
+def typed_table(table):
+	table = table.reindex(columns = list(column_types))
+	return table.astype(column_types)
+
+
+# Read table (Parquet or CSV)
+def read_table(path):
+	if path.endswith('.parquet'):
+		table = pd.read_parquet(path)
+	else:
+		table = pd.read_csv(path, dtype = str, keep_default_na = False, na_values = [''])
+	return typed_table(table)
+
+
+# Write table (Parquet or CSV) to a temporary file first, so an interrupted run does not leave a broken table
+def write_table(table, path):
+	handle, temp_path = tempfile.mkstemp(dir = os.path.dirname(os.path.abspath(path)), prefix = '.' + os.path.basename(path) + '.')
+	os.close(handle)
+
+	# mkstemp creates the file only readable for the owner, use the usual permissions instead
+	umask = os.umask(0)
+	os.umask(umask)
+	os.chmod(temp_path, 0o666 & ~umask)
+
+	try:
+		if path.endswith('.parquet'):
+			table.to_parquet(temp_path, index = False)
+		else:
+			table.to_csv(temp_path, index = False)
+		os.replace(temp_path, path)
+	except BaseException:
+		os.remove(temp_path)
+		raise
+
+
+# WES vs. WGS comparison for each WGS coverage over the whole cohort
+def compare_wes_wgs(table):
+	wgs = table[table['sequencing'] == 'WGS']
+	wes = table.loc[table['sequencing'] == 'WES', ['PID'] + metrics]
+
+	merged = wgs.merge(wes, on = 'PID', suffixes = ('_WGS', '_WES'))
+
+	wgs_values = merged[[m + '_WGS' for m in metrics]].set_axis(metrics, axis = 1).astype('Float64')
+	wes_values = merged[[m + '_WES' for m in metrics]].set_axis(metrics, axis = 1).astype('Float64')
+
+	difference = (wes_values - wgs_values).add_suffix('_difference')
+	ratio = (wes_values / wgs_values.mask(wgs_values == 0)).add_suffix('_ratio')  # no ratio if WGS count is 0
+
+	per_pid = pd.concat([merged[['coverage']], difference, ratio], axis = 1)
+
+	# count = number of PIDs with both WES and WGS value
+	comparison = per_pid.groupby('coverage', sort = False).agg(['count', 'mean', 'median'])
+	comparison.columns = ['_'.join(column) for column in comparison.columns]
+
+	return comparison.reindex(wgs_coverages).dropna(how = 'all').reset_index()
+
+
+
+# =============================================================================
+# Summary table
+# =============================================================================
+
+if os.path.isfile(output_file):
+	previous = read_table(output_file)
+else:
+	previous = typed_table(pd.DataFrame(columns = list(column_types)))
+
+if args.force:
+	previous_signatures = dict()
+else:
+	previous_signatures = previous.groupby('PID')['source_signature'].first().to_dict()
+
+kept = []
+updated = []
+
+for pid in pids:
+	signature = pid_signature(pid)
+
+	# Keep rows of PIDs whose result files did not change
+	if previous_signatures.get(pid) == signature:
+		kept.append(pid)
+	else:
+		updated.extend(pid_rows(pid, signature))
+
+# Keep rows of unchanged PIDs and of PIDs that were not given in this run
+updated_pids = [pid for pid in pids if pid not in kept]
+new_rows = typed_table(pd.DataFrame(updated))
+summary = pd.concat([previous[~previous['PID'].isin(updated_pids)], new_rows], ignore_index = True)
+
+# Sort by PID and coverage (WGS coverages first, then WES)
+coverage_order = {coverage: i for i, coverage in enumerate(wgs_coverages + [wes_coverage])}
+summary = summary.sort_values(['PID', 'coverage'], key = lambda column: column.map(coverage_order) if column.name == 'coverage' else column, ignore_index = True)
+
+write_table(summary, output_file)
+
+print('%d PIDs updated, %d PIDs unchanged'%(len(updated_pids), len(kept)))
+
+
+# =============================================================================
+# WES vs. WGS comparison
+# =============================================================================
+
+if comparison_file:
+	write_table(compare_wes_wgs(summary), comparison_file)